@@ -1,53 +1,126 @@
-from argparse import ArgumentParser, SUPPRESS
-import diffkemp.diffkemp
+from argparse import ArgumentParser, SUPPRESS, _SubParsersAction
+from functools import lru_cache
+import sys
 
 
-def make_argument_parser():
-    """Parsing CLI arguments."""
-    ap = ArgumentParser(description="Checking equivalence of semantics of "
-                                    "functions in large C projects.")
-    ap.add_argument("-v", "--verbose",
-                    help="increase output verbosity",
-                    action="count", default=0)
-    sub_ap = ap.add_subparsers(dest="command", metavar="command")
-    sub_ap.required = True
+def _lazy(name):
+    """
+    Create a sub-command handler which calls the function of the given name
+    from diffkemp.diffkemp. The module (and the whole analysis stack with it)
+    is imported only once the handler is run, hence building the parser and
+    printing help stays cheap.
+    """
+    def handler(args):
+        import diffkemp.diffkemp
+        return getattr(diffkemp.diffkemp, name)(args)
+    handler.__name__ = name
+    return handler
+
+
+class SharedFormatterArgumentParser(ArgumentParser):
+    """
+    Argument parser which creates a single help formatter for validation of
+    all its arguments. ArgumentParser.add_argument creates a new formatter
+    (once or even twice, depending on the Python version) for each added
+    argument, which makes up a considerable part of the parser construction
+    time. Formatters used for printing help are still created anew.
+    """
+    _adding_argument = False
+    _validation_formatter = None
+
+    def _get_formatter(self):
+        if not self._adding_argument:
+            return ArgumentParser._get_formatter(self)
+        if self._validation_formatter is None:
+            self._validation_formatter = ArgumentParser._get_formatter(self)
+        return self._validation_formatter
+
+    def add_argument(self, *args, **kwargs):
+        self._adding_argument = True
+        try:
+            return ArgumentParser.add_argument(self, *args, **kwargs)
+        finally:
+            self._adding_argument = False
+
 
-    # "build" sub-command
-    build_ap = sub_ap.add_parser("build",
-                                 help="build snapshot from Makefile project")
+class LazySubParsersAction(_SubParsersAction):
+    """
+    Sub-parsers action which postpones construction of sub-command parsers.
+    Each sub-command is registered together with a builder function which
+    adds the sub-command arguments to its parser. The builder is run only
+    once the sub-command is chosen on the command line.
+    """
+    def __init__(self, *args, **kwargs):
+        _SubParsersAction.__init__(self, *args, **kwargs)
+        self._builders = dict()
+
+    def add_parser(self, name, builder=None, **kwargs):
+        """
+        Register a new sub-command.
+        :param name: Name of the sub-command.
+        :param builder: Function taking the sub-command parser and adding
+                        sub-command arguments into it.
+        """
+        parser = _SubParsersAction.add_parser(self, name, **kwargs)
+        if builder is not None:
+            self._builders[name] = builder
+        return parser
+
+    def build_parser(self, name):
+        """Run the builder of the given sub-command (if not run already)."""
+        builder = self._builders.pop(name, None)
+        if builder is not None:
+            builder(self._name_parser_map[name])
+        return self._name_parser_map[name]
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        if values and values[0] in self._name_parser_map:
+            self.build_parser(values[0])
+        _SubParsersAction.__call__(self, parser, namespace, values,
+                                   option_string)
+
+
+def _build_build_parser(build_ap):
+    """Arguments of the "build" sub-command."""
     build_ap.add_argument("source_dir",
                           help="project's root directory")
     build_ap.add_argument("output_dir",
                           help="output directory of the snapshot")
     build_ap.add_argument("symbol_list", nargs='?',
                           help="list of symbols to compare")
-    build_ap.add_argument("--build-program", help="make tool used to be used\
-                          for build", default="make")
-    build_ap.add_argument("--build-file", help="filename of Makefile to be\
-                          used for build")
-    build_ap.add_argument("--clang", help="clang compiler to be used for\
-                          building", default="clang")
+    build_ap.add_argument("--build-program",
+                          help="make tool used to be used for build",
+                          default="make")
+    build_ap.add_argument("--build-file",
+                          help="filename of Makefile to be used for build")
+    build_ap.add_argument("--clang",
+                          help="clang compiler to be used for building",
+                          default="clang")
     build_ap.add_argument("--clang-append", help="option to append to clang",
                           action='append')
     build_ap.add_argument("--clang-drop", help="option to drop from clang",
                           action='append')
-    build_ap.add_argument("--llvm-link", help="llvm-link to be used for ll\
-                          file linking", default="llvm-link")
-    build_ap.add_argument("--llvm-dis", help="llvm-dis to be used for bc file\
-                          disassembly", default="llvm-dis")
+    build_ap.add_argument("--llvm-link",
+                          help="llvm-link to be used for ll file linking",
+                          default="llvm-link")
+    build_ap.add_argument("--llvm-dis",
+                          help="llvm-dis to be used for bc file disassembly",
+                          default="llvm-dis")
     build_ap.add_argument("--target", help="Makefile target to build",
                           action='append')
-    build_ap.add_argument("--reconfigure", help="reconfigure autotools-based\
-                          project with CC=<wrapper>", action="store_true")
+    build_ap.add_argument("--reconfigure",
+                          help="reconfigure autotools-based project with "
+                               "CC=<wrapper>",
+                          action="store_true")
     build_ap.add_argument("--no-native-cc-wrapper",
-                          help="do not use a native compiler wrapper even if\
-                          present", action="store_true")
-    build_ap.set_defaults(func=diffkemp.diffkemp.build)
-
-    # "build-kernel" sub-command
-    build_kernel_ap = sub_ap.add_parser(
-        "build-kernel",
-        help="generate snapshot from Linux kernel")
+                          help="do not use a native compiler wrapper even if "
+                               "present",
+                          action="store_true")
+    build_ap.set_defaults(func=_lazy("build"))
+
+
+def _build_build_kernel_parser(build_kernel_ap):
+    """Arguments of the "build-kernel" sub-command."""
     build_kernel_ap.add_argument("source_dir",
                                  help="kernel's root directory")
     build_kernel_ap.add_argument("output_dir",
@@ -62,12 +135,11 @@ def make_argument_parser():
         "--no-source-dir",
         action="store_true",
         help="do not store path to the source kernel directory in snapshot")
-    build_kernel_ap.set_defaults(func=diffkemp.diffkemp.build_kernel)
+    build_kernel_ap.set_defaults(func=_lazy("build_kernel"))
 
-    # "llvm-to-snapshot" sub-command
-    llvm_snapshot_ap = sub_ap.add_parser(
-        "llvm-to-snapshot",
-        help="generate snapshot from a single LLVM IR file")
+
+def _build_llvm_to_snapshot_parser(llvm_snapshot_ap):
+    """Arguments of the "llvm-to-snapshot" sub-command."""
     llvm_snapshot_ap.add_argument("source_dir",
                                   help="project's root directory")
     llvm_snapshot_ap.add_argument("llvm_file", help="name of the LLVM IR file")
@@ -75,58 +147,154 @@ def make_argument_parser():
                                   help="output directory of the snapshot")
     llvm_snapshot_ap.add_argument("function_list",
                                   help="list of functions to compare")
-    llvm_snapshot_ap.set_defaults(func=diffkemp.diffkemp.llvm_to_snapshot)
+    llvm_snapshot_ap.set_defaults(func=_lazy("llvm_to_snapshot"))
+
 
-    # "compare" sub-command
-    compare_ap = sub_ap.add_parser("compare",
-                                   help="compare generated snapshots for "
-                                        "semantic equality")
+# Supported semantic diff tools (see Config)
+_SEMDIFF_TOOLS = ("llreve",)
+
+# Options of the "compare" sub-command
+_COMPARE_OPTIONS = [
+    (("--show-diff",),
+     dict(help="show diff for non-equal functions",
+          action="store_true")),
+    (("--regex-filter",),
+     dict(help="filter function diffs by given regex")),
+    (("--output-dir", "-o"),
+     dict(help="name of the output directory")),
+    (("--stdout",),
+     dict(help="print results to stdout",
+          action="store_true")),
+    (("--report-stat",),
+     dict(help="report statistics of the analysis",
+          action="store_true")),
+    (("--source-dirs",),
+     dict(help="specify root dirs for the compared projects",
+          nargs=2)),
+    (("--function", "-f"),
+     dict(help="compare only selected function")),
+    (("--patterns", "-p"),
+     dict(help="difference pattern file or configuration")),
+    (("--output-llvm-ir",),
+     dict(help="output each simplified module to a file",
+          action="store_true")),
+    (("--control-flow-only",),
+     dict(help=SUPPRESS,
+          action="store_true")),
+    (("--print-asm-diffs",),
+     dict(help="print raw inline assembly differences (does not apply to "
+               "macros)",
+          action="store_true")),
+    (("--semdiff-tool",),
+     dict(help=SUPPRESS,
+          choices=_SEMDIFF_TOOLS)),
+    (("--show-errors",),
+     dict(help="show functions that are either unknown or ended with an "
+               "error in statistics",
+          action="store_true")),
+    (("--disable-simpll-ffi",),
+     dict(help="call SimpLL through binary (for debugging)",
+          action="store_true")),
+    (("--enable-module-cache",),
+     dict(help="loads frequently used modules to memory and uses them in "
+               "SimpLL",
+          action="store_true")),
+]
+
+
+def _build_compare_parser(compare_ap):
+    """Arguments of the "compare" sub-command."""
     compare_ap.add_argument("snapshot_dir_old",
                             help="directory with the old snapshot")
     compare_ap.add_argument("snapshot_dir_new",
                             help="directory with the new snapshot")
-    compare_ap.add_argument("--show-diff",
-                            help="show diff for non-equal functions",
-                            action="store_true")
-    compare_ap.add_argument("--regex-filter",
-                            help="filter function diffs by given regex")
-    compare_ap.add_argument("--output-dir", "-o",
-                            help="name of the output directory")
-    compare_ap.add_argument("--stdout", help="print results to stdout",
-                            action="store_true")
-    compare_ap.add_argument("--report-stat",
-                            help="report statistics of the analysis",
-                            action="store_true")
-    compare_ap.add_argument("--source-dirs",
-                            nargs=2,
-                            help="specify root dirs for the compared projects")
-    compare_ap.add_argument("--function", "-f",
-                            help="compare only selected function")
-    compare_ap.add_argument("--patterns", "-p",
-                            help="difference pattern file or configuration")
-    compare_ap.add_argument("--output-llvm-ir",
-                            help="output each simplified module to a file",
-                            action="store_true")
-    compare_ap.add_argument("--control-flow-only",
-                            help=SUPPRESS,
-                            action="store_true")
-    compare_ap.add_argument("--print-asm-diffs",
-                            help="print raw inline assembly differences (does \
-                            not apply to macros)",
-                            action="store_true")
-    compare_ap.add_argument("--semdiff-tool",
-                            help=SUPPRESS,
-                            choices=["llreve"])
-    compare_ap.add_argument("--show-errors",
-                            help="show functions that are either unknown or \
-                            ended with an error in statistics",
-                            action="store_true")
-    compare_ap.add_argument("--disable-simpll-ffi",
-                            help="call SimpLL through binary (for debugging)",
-                            action="store_true")
-    compare_ap.add_argument("--enable-module-cache",
-                            help="loads frequently used modules to memory and \
-                            uses them in SimpLL",
-                            action="store_true")
-    compare_ap.set_defaults(func=diffkemp.diffkemp.compare)
+    for flags, kwargs in _COMPARE_OPTIONS:
+        compare_ap.add_argument(*flags, **kwargs)
+    compare_ap.set_defaults(func=_lazy("compare"))
+
+
+# Help and builder function of each sub-command
+_SUB_COMMANDS = {
+    "build": ("build snapshot from Makefile project",
+              _build_build_parser),
+    "build-kernel": ("generate snapshot from Linux kernel",
+                     _build_build_kernel_parser),
+    "llvm-to-snapshot": ("generate snapshot from a single LLVM IR file",
+                         _build_llvm_to_snapshot_parser),
+    "compare": ("compare generated snapshots for semantic equality",
+                _build_compare_parser),
+}
+
+
+def _get_sub_command(argv):
+    """
+    Find the sub-command chosen in the given list of CLI arguments.
+    Returns None if no known sub-command is chosen or if the top-level help
+    is requested before the sub-command.
+    """
+    for arg in argv:
+        if arg == "--":
+            continue
+        # The only top-level option (-v) takes no value, hence the first
+        # positional argument is the sub-command.
+        if arg == "-" or not arg.startswith("-"):
+            return arg if arg in _SUB_COMMANDS else None
+        # Help may be requested by an abbreviated long option (e.g. --he) or
+        # within a cluster of short options (e.g. -vh)
+        if arg.startswith("--"):
+            if "--help".startswith(arg):
+                return None
+        elif "h" in arg:
+            return None
+    return None
+
+
+def make_argument_parser(argv=None):
+    """
+    Parsing CLI arguments.
+    :param argv: List of CLI arguments that will be parsed (sys.argv[1:] by
+                 default). If it contains a known sub-command, only that
+                 sub-command is registered into the parser. Otherwise, all
+                 sub-commands are registered so that help and error messages
+                 remain complete.
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+    return _make_argument_parser(_get_sub_command(argv))
+
+
+@lru_cache(maxsize=None)
+def _make_argument_parser(command):
+    """
+    Create the argument parser with the given sub-command registered (all
+    sub-commands if command is None).
+    The parser is not modified by parsing (except for lazily building the
+    sub-command parsers), so it is created only once for each sub-command and
+    shared among all callers.
+    """
+    ap = SharedFormatterArgumentParser(
+        description="Checking equivalence of semantics of functions in large "
+                    "C projects.")
+    ap.register("action", "parsers", LazySubParsersAction)
+    ap.add_argument("-v", "--verbose",
+                    help="increase output verbosity",
+                    action="count", default=0)
+    sub_ap = ap.add_subparsers(dest="command", metavar="command")
+    sub_ap.required = True
+
+    # Sub-command parsers are only filled with arguments once they are used
+    for name, (help_msg, builder) in _SUB_COMMANDS.items():
+        if command is None or name == command:
+            sub_ap.add_parser(name, help=help_msg, builder=builder)
     return ap
+
+
+def run_from_cli():
+    """
+    Main method to run the tool. The analysis stack (diffkemp.diffkemp) is
+    imported only once the chosen sub-command is run.
+    """
+    argv = sys.argv[1:]
+    ap = make_argument_parser(argv)
+    args = ap.parse_args(argv)
+    args.func(args)
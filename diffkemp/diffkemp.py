@@ -1,5 +1,4 @@
 from diffkemp.building.cc_wrapper import get_cc_wrapper_path, wrapper_env_vars
-from diffkemp.cli import make_argument_parser
 from diffkemp.config import Config
 from diffkemp.snapshot import Snapshot
 from diffkemp.llvm_ir.kernel_source_tree import KernelSourceTree
@@ -22,13 +21,6 @@ import re
 import sys
 
 
-def run_from_cli():
-    """Main method to run the tool."""
-    ap = make_argument_parser()
-    args = ap.parse_args()
-    args.func(args)
-
-
 def build(args):
     # Generate wrapper for C/C++ compiler
     cc_wrapper = get_cc_wrapper_path(args.no_native_cc_wrapper)
@@ -6,7 +6,7 @@ key in the YAML spec file.
 """
 from diffkemp.semdiff.function_diff import functions_diff
 from diffkemp.semdiff.result import Result
-from .task_spec import TaskSpec, specs_path, tasks_path
+from .task_spec import TaskSpec, get_paths
 import glob
 import os
 import pytest
@@ -16,10 +16,11 @@ import yaml
 def collect_task_specs():
     """Collecting and parsing YAML files with test specifications."""
     result = list()
-    if not os.path.isdir(tasks_path):
-        os.mkdir(tasks_path)
+    paths = get_paths()
+    if not os.path.isdir(paths.tasks):
+        os.mkdir(paths.tasks)
     cwd = os.getcwd()
-    os.chdir(specs_path)
+    os.chdir(paths.specs)
     for spec_file_path in glob.glob("*.yaml"):
         with open(spec_file_path, "r") as spec_file:
             try:
@@ -1,7 +1,12 @@
 """Functions for working with modules used by regression tests."""
 
+from functools import lru_cache
+from types import SimpleNamespace
+import hashlib
+import json
 import os
 import shutil
+import sys
 
 from diffkemp.config import Config
 from diffkemp.llvm_ir.kernel_llvm_source_builder import KernelLlvmSourceBuilder
@@ -12,10 +17,110 @@ from diffkemp.snapshot import Snapshot
 from diffkemp.utils import get_llvm_version
 
 
-base_path = os.path.abspath(".")
-patterns_path = os.path.abspath("tests/regression/patterns")
-specs_path = os.path.abspath("tests/regression/test_specs")
-tasks_path = os.path.abspath("tests/regression/kernel_modules")
+@lru_cache(maxsize=None)
+def get_paths():
+    """
+    Get paths used by the regression tests. These are relative to the working
+    directory at the time of the first call (the repository root is expected)
+    and are computed only once.
+    """
+    cwd = os.getcwd()
+    return SimpleNamespace(
+        base=cwd,
+        patterns=os.path.join(cwd, "tests/regression/patterns"),
+        specs=os.path.join(cwd, "tests/regression/test_specs"),
+        tasks=os.path.join(cwd, "tests/regression/kernel_modules"))
+
+
+@lru_cache(maxsize=1)
+def _llvm_version():
+    """
+    Get the LLVM major version. Since it requires running llvm-config, it is
+    done only once.
+    """
+    return get_llvm_version()
+
+
+@lru_cache(maxsize=None)
+def _kernel_builder(kernel_dir):
+    """
+    Get the LLVM source builder of the given kernel. The builder is created
+    only once and shared among all tasks using the kernel so that the kernel
+    is prepared for building and scanned by CScope only once. Source trees
+    (and LLVM modules created from them) are not shared since the modules are
+    modified during the comparison.
+    """
+    return KernelLlvmSourceBuilder(kernel_dir)
+
+
+# Version of the format of the cached pattern configurations, must be bumped
+# whenever the cached data change
+_PATTERN_CACHE_VERSION = 1
+
+
+def _file_stamps(files):
+    """Get modification times of the given files."""
+    return [[f, os.stat(f).st_mtime_ns] for f in sorted(files)]
+
+
+def _load_pattern_config(path, patterns_path):
+    """
+    Load the pattern configuration from a file. Since loading a configuration
+    runs `opt` to verify each pattern, the loaded pattern files and settings
+    are persistently cached as JSON in $XDG_CACHE_HOME/diffkemp/patterns (or
+    in ~/.cache/diffkemp/patterns if XDG_CACHE_HOME is not set). The cache
+    stores only plain data from which the configuration object is rebuilt, so
+    it does not depend on the PatternConfig class layout. Cached data are
+    reused only if the cache format version and the LLVM version match and if
+    the configuration file and all its pattern files are unchanged.
+    """
+    cache_dir = os.path.join(
+        os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+        "diffkemp", "patterns")
+    cache_file = os.path.join(
+        cache_dir, "{}.json".format(hashlib.sha1(path.encode()).hexdigest()))
+    key = [_PATTERN_CACHE_VERSION, path, patterns_path, _llvm_version()]
+
+    try:
+        with open(cache_file, "r") as cache:
+            cached_key, stamps, pattern_files, settings = json.load(cache)
+        if cached_key == key and \
+                stamps == _file_stamps({path} | set(pattern_files)):
+            config = PatternConfig(path, patterns_path)
+            config.pattern_files = set(pattern_files)
+            config.settings.update(settings)
+            return config
+    except (OSError, ValueError, TypeError):
+        # Missing, outdated, or corrupted cache file
+        pass
+
+    config = PatternConfig.create_from_file(path=path,
+                                            patterns_path=patterns_path)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(cache_file, "w") as cache:
+            json.dump([key,
+                       _file_stamps({path} | config.pattern_files),
+                       sorted(config.pattern_files),
+                       config.settings],
+                      cache)
+    except OSError:
+        pass
+    return config
+
+
+def _copy_file(src, dst):
+    """
+    Copy a file to the given destination unless the destination exists.
+    Creates a hard link if possible (which is much cheaper for large LLVM
+    files) and falls back to copying, e.g., when crossing file systems.
+    """
+    if os.path.isfile(dst):
+        return
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
 
 
 class FunctionSpec:
@@ -24,6 +129,8 @@ class FunctionSpec:
     it is located and the expected result of the function comparison between
     two kernel versions.
     """
+    __slots__ = ("name", "old_module", "new_module", "result")
+
     def __init__(self, name, result, old_module=None, new_module=None):
         self.name = name
         self.old_module = old_module
@@ -39,19 +146,28 @@ class TaskSpec:
     Task specification representing testing scenario.
     Contains a list of functions to be compared with DiffKemp during the test.
     """
+    __slots__ = ("old_kernel_dir", "new_kernel_dir", "name", "task_dir",
+                 "_path_tmpl", "pattern_config", "control_flow_only",
+                 "old_kernel", "new_kernel", "old_snapshot", "new_snapshot",
+                 "config", "functions")
+
     def __init__(self, spec, task_name, kernel_path):
         self.old_kernel_dir = os.path.join(kernel_path, spec["old_kernel"])
         self.new_kernel_dir = os.path.join(kernel_path, spec["new_kernel"])
         self.name = task_name
-        self.task_dir = os.path.join(tasks_path, task_name)
+        self.task_dir = os.path.join(get_paths().tasks, task_name)
+        # Template of names of the task files (see _file_name), braces in
+        # the directory path must be escaped
+        self._path_tmpl = os.path.join(
+            self.task_dir.replace("{", "{{").replace("}", "}}"),
+            "{name}_{suffix}.{ext}")
         if "pattern_config" in spec:
-            if get_llvm_version() >= 15:
-                config_filename = spec["pattern_config"]["opaque"]
-            else:
-                config_filename = spec["pattern_config"]["explicit"]
-            self.pattern_config = PatternConfig.create_from_file(
-                path=os.path.join(patterns_path, config_filename),
-                patterns_path=base_path
+            # LLVM 15+ uses opaque pointers
+            variant = "opaque" if _llvm_version() >= 15 else "explicit"
+            config_filename = spec["pattern_config"][variant]
+            self.pattern_config = _load_pattern_config(
+                path=os.path.join(get_paths().patterns, config_filename),
+                patterns_path=get_paths().base
             )
         else:
             self.pattern_config = None
@@ -62,9 +178,9 @@ class TaskSpec:
 
         # Create LLVM sources and configuration
         self.old_kernel = KernelSourceTree(
-            self.old_kernel_dir, KernelLlvmSourceBuilder(self.old_kernel_dir))
+            self.old_kernel_dir, _kernel_builder(self.old_kernel_dir))
         self.new_kernel = KernelSourceTree(
-            self.new_kernel_dir, KernelLlvmSourceBuilder(self.new_kernel_dir))
+            self.new_kernel_dir, _kernel_builder(self.new_kernel_dir))
         self.old_snapshot = Snapshot(self.old_kernel, self.old_kernel)
         self.new_snapshot = Snapshot(self.new_kernel, self.new_kernel)
         self.config = Config(self.old_snapshot, self.new_snapshot, False,
@@ -82,6 +198,8 @@ class TaskSpec:
 
     def add_function_spec(self, fun, result):
         """Add a function comparison specification."""
+        # The same function names are used by many specs, intern them
+        fun = sys.intern(fun)
         self.functions[fun] = FunctionSpec(fun, result)
 
     def build_modules_for_function(self, fun):
@@ -89,8 +207,8 @@ class TaskSpec:
         Build LLVM modules containing definition of the compared function in
         both kernels.
         """
-        # Since PyTest may share KernelSourceTree objects among tasks, we need
-        # to explicitly initialize kernels.
+        # Kernel source builders are shared among tasks (and finalized after
+        # each test), hence we need to explicitly initialize kernels.
         self.old_kernel.initialize()
         self.new_kernel.initialize()
         mod_old = self.old_kernel.get_module_for_symbol(fun)
@@ -103,8 +221,8 @@ class TaskSpec:
         """
         Get name of a task file having the given name, suffix, and extension.
         """
-        return os.path.join(self.task_dir,
-                            "{}_{}.{}".format(name or self.name, suffix, ext))
+        return self._path_tmpl.format(name=name or self.name, suffix=suffix,
+                                      ext=ext)
 
     def old_llvm_file(self, name=None):
         """Name of the old LLVM file in the task dir."""
@@ -132,17 +250,14 @@ class TaskSpec:
         :param name: Optional parameter to specify the new file names. If None
                      then the spec name is used.
         """
-        if not os.path.isdir(self.task_dir):
-            os.mkdir(self.task_dir)
+        os.makedirs(self.task_dir, exist_ok=True)
 
-        if not os.path.isfile(self.old_llvm_file(name)):
-            shutil.copyfile(old_module.llvm, self.old_llvm_file(name))
-        if old_src and not os.path.isfile(self.old_src_file(name)):
-            shutil.copyfile(old_src, self.old_src_file(name))
-        if not os.path.isfile(self.new_llvm_file(name)):
-            shutil.copyfile(new_module.llvm, self.new_llvm_file(name))
-        if new_src and not os.path.isfile(self.new_src_file(name)):
-            shutil.copyfile(new_src, self.new_src_file(name))
+        _copy_file(old_module.llvm, self.old_llvm_file(name))
+        if old_src:
+            _copy_file(old_src, self.old_src_file(name))
+        _copy_file(new_module.llvm, self.new_llvm_file(name))
+        if new_src:
+            _copy_file(new_src, self.new_src_file(name))
 
 
 class SysctlTaskSpec(TaskSpec):
@@ -150,6 +265,9 @@ class SysctlTaskSpec(TaskSpec):
     Task specification for test of sysctl comparison.
     Extends TaskSpec by data variable and proc handler function.
     """
+    __slots__ = ("data_var", "proc_handler", "old_sysctl_module",
+                 "new_sysctl_module")
+
     def __init__(self, spec, task_name, kernel_path, data_var):
         TaskSpec.__init__(self, spec, task_name, kernel_path)
         self.data_var = data_var
@@ -181,6 +299,8 @@ class ModuleParamSpec(TaskSpec):
     Task specification for test of kernel module parameter comparison.
     Extends TaskSpec by module and parameter specification.
     """
+    __slots__ = ("dir", "mod", "param", "old_module", "new_module")
+
     def __init__(self, spec, dir, mod, param, kernel_path):
         TaskSpec.__init__(self, spec, "{}-{}".format(mod, param), kernel_path)
         self.dir = dir
@@ -204,6 +324,8 @@ class DiffSpec:
     Specification of a syntax difference. Contains the name of the differing
     symbol and its old and new definition.
     """
+    __slots__ = ("symbol", "def_old", "def_new")
+
     def __init__(self, symbol, def_old, def_new):
         self.symbol = symbol
         self.def_old = def_old
@@ -216,6 +338,8 @@ class SyntaxDiffSpec(TaskSpec):
     Extends TaskSpec by concrete syntax differences that should be found by
     DiffKemp. These are currently intended to be macros or inline assemblies.
     """
+    __slots__ = ("equal_symbols", "syntax_diffs")
+
     def __init__(self, spec, task_name, kernel_path):
         TaskSpec.__init__(self, spec, task_name, kernel_path)
         self.equal_symbols = set()
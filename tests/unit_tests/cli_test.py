@@ -0,0 +1,124 @@
+"""Unit tests for parsing of the command line arguments."""
+
+from diffkemp.cli import make_argument_parser, _make_argument_parser
+import pytest
+import subprocess
+import sys
+
+
+def get_sub_ap(ap):
+    """Get the sub-parsers action of the main argument parser."""
+    return next(action for action in ap._actions
+                if action.dest == "command")
+
+
+def test_sub_parsers_built_lazily():
+    """
+    Parse arguments of a sub-command and check that only the parser of the
+    chosen sub-command was filled with arguments.
+    """
+    # Parsing builds sub-parsers of the cached parser, start from a fresh one
+    _make_argument_parser.cache_clear()
+    ap = make_argument_parser([])
+    sub_ap = get_sub_ap(ap)
+    assert set(sub_ap._builders.keys()) == {"build", "build-kernel",
+                                            "llvm-to-snapshot", "compare"}
+
+    args = ap.parse_args(["compare", "old", "new", "--show-diff"])
+    assert args.command == "compare"
+    assert args.snapshot_dir_old == "old"
+    assert args.snapshot_dir_new == "new"
+    assert args.show_diff
+    assert args.verbose == 0
+    assert "compare" not in sub_ap._builders
+    assert set(sub_ap._builders.keys()) == {"build", "build-kernel",
+                                            "llvm-to-snapshot"}
+
+
+@pytest.mark.parametrize("argv,commands", [
+    (["compare", "old", "new"], {"compare"}),
+    (["-v", "-v", "build", "src", "out"], {"build"}),
+    (["build-kernel", "-h"], {"build-kernel"}),
+    (["-h", "compare"], {"build", "build-kernel", "llvm-to-snapshot",
+                         "compare"}),
+    (["--help", "compare"], {"build", "build-kernel", "llvm-to-snapshot",
+                             "compare"}),
+    (["--he", "compare"], {"build", "build-kernel", "llvm-to-snapshot",
+                           "compare"}),
+    (["-vh", "compare"], {"build", "build-kernel", "llvm-to-snapshot",
+                          "compare"}),
+    (["--verb", "compare", "old", "new"], {"compare"}),
+    (["--", "compare", "old", "new"], {"compare"}),
+    (["unknown"], {"build", "build-kernel", "llvm-to-snapshot", "compare"}),
+    ([], {"build", "build-kernel", "llvm-to-snapshot", "compare"}),
+])
+def test_registered_sub_commands(argv, commands):
+    """
+    Check that only the chosen sub-command is registered into the parser and
+    that all sub-commands are registered if none (or the top-level help) is
+    chosen.
+    """
+    sub_ap = get_sub_ap(make_argument_parser(argv))
+    assert set(sub_ap.choices.keys()) == commands
+
+
+@pytest.mark.parametrize("argv,func", [
+    (["build", "src", "out"], "build"),
+    (["build-kernel", "src", "out", "list"], "build_kernel"),
+    (["llvm-to-snapshot", "src", "file.ll", "out", "list"],
+     "llvm_to_snapshot"),
+    (["-v", "compare", "old", "new"], "compare"),
+])
+def test_sub_command_handlers(argv, func):
+    """Check that each sub-command gets the correct handler."""
+    args = make_argument_parser(argv).parse_args(argv)
+    assert args.func.__name__ == func
+
+
+def test_parser_cached():
+    """Check that the parser is created only once for each sub-command."""
+    ap = make_argument_parser(["compare", "old", "new"])
+    assert make_argument_parser(["compare", "new", "old"]) is ap
+    assert make_argument_parser(["build", "src", "out"]) is not ap
+
+
+def test_shared_validation_formatter():
+    """
+    Check that a single formatter is used for validation of all arguments
+    while help is still printed using fresh formatters.
+    """
+    # The parser is modified, do not use (and pollute) the cached one
+    ap = _make_argument_parser.__wrapped__("compare")
+    formatter = ap._validation_formatter
+    assert formatter is not None
+    ap.add_argument("--test-option-1")
+    ap.add_argument("--test-option-2")
+    assert ap._validation_formatter is formatter
+    assert ap._get_formatter() is not formatter
+    assert "--test-option-2" in ap.format_help()
+
+
+def test_invalid_sub_command():
+    """Parsing an unknown sub-command must fail."""
+    with pytest.raises(SystemExit):
+        make_argument_parser(["unknown"]).parse_args(["unknown"])
+
+
+def test_help_does_not_import_analysis():
+    """
+    Check that importing the CLI and printing help does not import the
+    analysis stack (diffkemp.diffkemp). Run in a fresh interpreter so that
+    modules imported by other tests do not interfere.
+    """
+    check = "\n".join([
+        "import sys",
+        "from diffkemp.cli import make_argument_parser",
+        "for argv in [['-h'], ['compare', '-h']]:",
+        "    try:",
+        "        make_argument_parser(argv).parse_args(argv)",
+        "    except SystemExit:",
+        "        pass",
+        "assert 'diffkemp.diffkemp' not in sys.modules",
+    ])
+    subprocess.run([sys.executable, "-c", check], check=True,
+                   stdout=subprocess.DEVNULL)